@@ -0,0 +1,189 @@
+import asyncio
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+
+from .rag_service import RAGService
+
+# How long the worker waits for more jobs after the first one arrives before
+# writing a batch. Together with the embedding/write time this bounds how long
+# it takes for new documents to show up in queries.
+BATCH_WINDOW_SECONDS = 1.0
+
+# Upper bound on documents gathered into a single batch
+MAX_BATCH_DOCUMENTS = 500
+
+# Upper bound on documents in a single add job
+MAX_DOCUMENTS_PER_JOB = 100
+
+# Jobs waiting for the worker; submissions beyond this are rejected so the
+# freshness lag stays bounded under sustained load
+MAX_QUEUED_JOBS = 200
+
+# Finished jobs kept around for the status endpoint
+MAX_TRACKED_JOBS = 1000
+
+class IngestionQueueFull(Exception):
+    """Raised when a job is submitted while MAX_QUEUED_JOBS are already waiting"""
+
+class IngestionQueue:
+    """Background worker that applies add/update/delete jobs to the RAG collection"""
+
+    def __init__(self, rag_service: RAGService, batch_window: float = BATCH_WINDOW_SECONDS,
+                 max_batch_documents: int = MAX_BATCH_DOCUMENTS, max_queued_jobs: int = MAX_QUEUED_JOBS):
+        self.rag_service = rag_service
+        self.batch_window = batch_window
+        self.max_batch_documents = max_batch_documents
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued_jobs)
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background worker on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background worker"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def submit(self, action: str, documents: Optional[List[Dict[str, Any]]] = None,
+               ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Queue an add, update or delete job and return its status record"""
+        if action not in ("add", "update", "delete"):
+            raise ValueError(f"Unknown ingestion action: {action}")
+        if self._queue.full():
+            raise IngestionQueueFull(f"{self._queue.maxsize} ingestion jobs already queued")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "action": action,
+            "status": "queued",
+            "document_ids": ids if action == "delete" else [doc["id"] for doc in documents or []],
+            "submitted_at": time.time(),
+            "completed_at": None,
+            "error": None
+        }
+        self.jobs[job["job_id"]] = job
+        self._trim_jobs()
+        self._queue.put_nowait((job, documents or []))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def _trim_jobs(self):
+        """Forget the oldest finished jobs once more than MAX_TRACKED_JOBS are tracked"""
+        excess = len(self.jobs) - MAX_TRACKED_JOBS
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job["status"] in ("completed", "failed")][:excess]:
+            del self.jobs[job_id]
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            batch_documents = len(batch[0][1])
+
+            # Collect whatever else arrives within the batch window
+            deadline = time.monotonic() + self.batch_window
+            while batch_documents < self.max_batch_documents:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                batch_documents += len(item[1])
+
+            for job, _ in batch:
+                job["status"] = "running"
+
+            # Embedding and collection writes block, so keep them off the event loop
+            try:
+                errors = await asyncio.to_thread(self._apply_batch, batch)
+            except Exception as e:
+                print(f"Warning: Ingestion batch failed ({e})")
+                errors = {job["job_id"]: str(e) for job, _ in batch}
+
+            completed_at = time.time()
+            for job, _ in batch:
+                job["error"] = errors.get(job["job_id"])
+                job["status"] = "failed" if job["error"] else "completed"
+                job["completed_at"] = completed_at
+
+    def _apply_batch(self, batch: List[tuple]) -> Dict[str, str]:
+        """Apply a batch of jobs and return an error message for each failed job.
+
+        Jobs are checked in order against the stored documents: add fails if an
+        id already exists, update and delete fail if an id is missing. The
+        remaining jobs collapse to one upsert and one delete, last write per id
+        wins. Every job that touched an id is tied to that id's write, so if the
+        write fails they are all marked failed. An update without metadata keeps
+        the stored metadata.
+        """
+        errors: Dict[str, str] = {}
+        touched_ids = {doc_id for job, _ in batch for doc_id in job["document_ids"]}
+        known_metadata = self.rag_service.get_document_metadata(list(touched_ids))
+
+        # doc_id -> (ids of jobs that touched it, document to write or None to delete)
+        pending: Dict[str, tuple] = {}
+        for job, documents in batch:
+            job_id = job["job_id"]
+            if job["action"] == "add":
+                existing = [doc_id for doc_id in job["document_ids"] if doc_id in known_metadata]
+                if existing:
+                    errors[job_id] = f"Documents already exist: {', '.join(existing)}"
+                    continue
+            else:
+                missing = [doc_id for doc_id in job["document_ids"] if doc_id not in known_metadata]
+                if missing:
+                    errors[job_id] = f"Documents not found: {', '.join(missing)}"
+                    continue
+
+            if job["action"] == "delete":
+                writes = [(doc_id, None) for doc_id in job["document_ids"]]
+                for doc_id in job["document_ids"]:
+                    del known_metadata[doc_id]
+            else:
+                writes = []
+                for doc in documents:
+                    if doc.get("metadata") is None:
+                        doc = {**doc, "metadata": known_metadata[doc["id"]]}
+                    known_metadata[doc["id"]] = doc["metadata"]
+                    writes.append((doc["id"], doc))
+
+            for doc_id, doc in writes:
+                job_ids = pending[doc_id][0] if doc_id in pending else []
+                pending[doc_id] = (job_ids + [job_id], doc)
+
+        upserts = [(job_ids, doc) for job_ids, doc in pending.values() if doc is not None]
+        deletes = [(job_ids, doc_id) for doc_id, (job_ids, doc) in pending.items() if doc is None]
+        self._write(self.rag_service.upsert_documents, upserts, errors)
+        self._write(self.rag_service.delete_documents, deletes, errors)
+        return errors
+
+    def _write(self, write, items: List[tuple], errors: Dict[str, str]):
+        """Write (job_ids, payload) items in one call, retrying id by id if that fails"""
+        if not items:
+            return
+        try:
+            write([payload for _, payload in items])
+            return
+        except Exception as e:
+            print(f"Warning: Batched ingestion write failed ({e}), retrying per document")
+
+        for job_ids, payload in items:
+            try:
+                write([payload])
+            except Exception as e:
+                for job_id in job_ids:
+                    errors.setdefault(job_id, str(e))
@@ -2,15 +2,25 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+from typing import Annotated, List, Dict, Optional, Union
+from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 from .rag_service import RAGService
+from .ingestion import IngestionQueue, IngestionQueueFull, MAX_DOCUMENTS_PER_JOB
 import uvicorn
 
 load_dotenv()
 
-app = FastAPI(title="LegalAssistant Agent", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Run the ingestion worker for as long as the server is up
+    ingestion_queue.start()
+    yield
+    await ingestion_queue.stop()
+
+app = FastAPI(title="LegalAssistant Agent", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -23,6 +33,7 @@ app.add_middleware(
 
 # Initialize RAG service
 rag_service = RAGService()
+ingestion_queue = IngestionQueue(rag_service)
 
 class QueryRequest(BaseModel):
     query: str
@@ -32,6 +43,36 @@ class QueryResponse(BaseModel):
     answer: str
     sources: list
     confidence: float
+    route: str = ""
+
+# ChromaDB only accepts non-empty, flat metadata with scalar values
+DocumentMetadata = Annotated[Dict[str, Union[str, int, float, bool]], Field(min_length=1)]
+
+class DocumentRequest(BaseModel):
+    id: str = Field(min_length=1)
+    content: str = Field(min_length=1)
+    metadata: DocumentMetadata = {"type": "uncategorized"}
+
+class DocumentUpdateRequest(BaseModel):
+    content: str = Field(min_length=1)
+    # Omit to keep the stored metadata
+    metadata: Optional[DocumentMetadata] = None
+
+class AddDocumentsRequest(BaseModel):
+    documents: List[DocumentRequest] = Field(min_length=1, max_length=MAX_DOCUMENTS_PER_JOB)
+
+    @field_validator("documents")
+    @classmethod
+    def unique_ids(cls, documents: List[DocumentRequest]) -> List[DocumentRequest]:
+        if len({doc.id for doc in documents}) != len(documents):
+            raise ValueError("Document ids must be unique")
+        return documents
+
+def submit_ingestion_job(action: str, **kwargs):
+    try:
+        return ingestion_queue.submit(action, **kwargs)
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 @app.get("/")
 async def root():
@@ -48,7 +89,8 @@ async def query_documents(request: QueryRequest):
         return QueryResponse(
             answer=result["answer"],
             sources=result["sources"],
-            confidence=result["confidence"]
+            confidence=result["confidence"],
+            route=result.get("route", "")
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -57,6 +99,30 @@ async def query_documents(request: QueryRequest):
 async def health_check():
     return {"status": "healthy"}
 
+@app.post("/documents", status_code=202)
+async def add_documents(request: AddDocumentsRequest):
+    return submit_ingestion_job("add", documents=[doc.model_dump() for doc in request.documents])
+
+@app.put("/documents/{document_id}", status_code=202)
+async def update_document(document_id: str, request: DocumentUpdateRequest):
+    document = {"id": document_id, "content": request.content, "metadata": request.metadata}
+    return submit_ingestion_job("update", documents=[document])
+
+@app.delete("/documents/{document_id}", status_code=202)
+async def delete_document(document_id: str):
+    return submit_ingestion_job("delete", ids=[document_id])
+
+@app.get("/documents/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    job = ingestion_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/routing/stats")
+async def routing_stats():
+    return rag_service.get_route_stats()
+
 # Serve static files
 static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
 if os.path.exists(static_dir):
@@ -4,6 +4,95 @@ import chromadb
 import json
 from typing import List, Dict, Any
 import asyncio
+import time
+
+# Model routing table, checked in order. The first route whose thresholds all
+# hold for a query wins; the last route should have no thresholds so it acts
+# as the catch-all. Override with a JSON file via MODEL_ROUTES_FILE.
+DEFAULT_MODEL_ROUTES = [
+    {
+        "name": "simple",
+        "max_query_words": 15,
+        "max_practice_areas": 1,
+        "min_score_spread": 0.05,
+        "model": "gpt-3.5-turbo",
+        "max_tokens": 200,
+        "max_results": 2
+    },
+    {
+        "name": "standard",
+        "max_query_words": 40,
+        "max_practice_areas": 2,
+        "model": "gpt-3.5-turbo",
+        "max_tokens": 500,
+        "max_results": 5
+    },
+    {
+        "name": "complex",
+        "model": "gpt-3.5-turbo",
+        "max_tokens": 800,
+        "max_results": 5
+    }
+]
+
+# Retrieved documents within this distance of the best match count towards
+# the number of practice areas a query touches
+PRACTICE_AREA_DISTANCE_MARGIN = 0.1
+
+# Number of top documents a query is classified on, so the practice area
+# count and score spread do not depend on the caller's max_results
+CLASSIFICATION_CANDIDATES = 5
+
+# Route fields compared against numbers, and those used as request limits
+ROUTE_THRESHOLD_FIELDS = ("max_query_words", "max_practice_areas", "min_score_spread")
+ROUTE_LIMIT_FIELDS = ("max_tokens", "max_results")
+
+# Maximum number of texts sent to the embeddings API in one request
+EMBEDDING_BATCH_SIZE = 100
+
+def _is_valid_route(route: Any) -> bool:
+    """Check a routing table entry has a name, numeric thresholds and positive integer limits"""
+    if not isinstance(route, dict) or not isinstance(route.get("name"), str):
+        return False
+    if "model" in route and not isinstance(route["model"], str):
+        return False
+    for field in ROUTE_THRESHOLD_FIELDS:
+        if field in route and (isinstance(route[field], bool) or not isinstance(route[field], (int, float))):
+            return False
+    for field in ROUTE_LIMIT_FIELDS:
+        if field in route and (isinstance(route[field], bool) or not isinstance(route[field], int) or route[field] < 1):
+            return False
+    return True
+
+def load_model_routes() -> List[Dict[str, Any]]:
+    """Load the model routing table, falling back to the defaults"""
+    routes_file = os.getenv("MODEL_ROUTES_FILE")
+    if routes_file:
+        try:
+            with open(routes_file) as f:
+                routes = json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load model routes from {routes_file} ({e}), using defaults")
+            return DEFAULT_MODEL_ROUTES
+        if not isinstance(routes, list) or not routes or not all(_is_valid_route(route) for route in routes):
+            print(f"Warning: {routes_file} must hold a non-empty list of named routes with numeric "
+                  f"thresholds and positive integer limits, using defaults")
+            return DEFAULT_MODEL_ROUTES
+        return routes
+    return DEFAULT_MODEL_ROUTES
+
+def _empty_route_stats() -> Dict[str, Any]:
+    return {
+        "requests": 0,
+        "errors": 0,
+        "total_latency_ms": 0.0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        # Sums of the classification inputs, for tuning route thresholds
+        "total_query_words": 0,
+        "total_practice_areas": 0,
+        "total_score_spread": 0.0
+    }
 
 class RAGService:
     def __init__(self):
@@ -27,6 +116,13 @@ class RAGService:
                 metadata={"hnsw:space": "cosine"}
             )
         
+        # Model routing table and per-route latency/token usage
+        self.model_routes = load_model_routes()
+        self.route_stats = {
+            route["name"]: _empty_route_stats()
+            for route in self.model_routes
+        }
+        
         # Initialize database if empty
         if self.collection.count() == 0:
             self._initialize_database()
@@ -376,14 +472,7 @@ class RAGService:
         ]
         
         # Add documents to collection with OpenAI embeddings
-        for doc in legal_documents:
-            embedding = self._get_embedding(doc["content"])
-            self.collection.add(
-                documents=[doc["content"]],
-                embeddings=[embedding],
-                metadatas=[doc["metadata"]],
-                ids=[doc["id"]]
-            )
+        self.upsert_documents(legal_documents)
     
     def _get_embedding(self, text: str) -> List[float]:
         """Generate embedding using OpenAI's API"""
@@ -393,8 +482,110 @@ class RAGService:
         )
         return response.data[0].embedding
     
+    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for many texts, EMBEDDING_BATCH_SIZE per API call"""
+        embeddings = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            response = self.openai_client.embeddings.create(
+                model="text-embedding-3-small",
+                input=texts[start:start + EMBEDDING_BATCH_SIZE]
+            )
+            # The API returns one item per input, tagged with its position
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return embeddings
+    
+    def upsert_documents(self, documents: List[Dict[str, Any]]):
+        """Embed and write documents (dicts with id, content, metadata) in a single collection call"""
+        if not documents:
+            return
+        embeddings = self._get_embeddings([doc["content"] for doc in documents])
+        self.collection.upsert(
+            documents=[doc["content"] for doc in documents],
+            embeddings=embeddings,
+            metadatas=[doc["metadata"] for doc in documents],
+            ids=[doc["id"] for doc in documents]
+        )
+    
+    def get_document_metadata(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the stored metadata of whichever of the given ids exist"""
+        if not ids:
+            return {}
+        result = self.collection.get(ids=ids, include=["metadatas"])
+        return dict(zip(result["ids"], result["metadatas"]))
+    
+    def delete_documents(self, ids: List[str]):
+        """Remove documents from the collection by id"""
+        if ids:
+            self.collection.delete(ids=ids)
+    
+    def _classify_query(self, query: str, metadatas: List[Dict[str, Any]], distances: List[float]) -> tuple:
+        """Pick a model route from query length, practice areas touched and retrieval score spread.
+        
+        Returns the route and the values it was classified on.
+        """
+        query_words = len(query.split())
+        
+        if distances:
+            best = min(distances)
+            practice_areas = len({
+                metadata.get("type")
+                for metadata, distance in zip(metadatas, distances)
+                if distance - best <= PRACTICE_AREA_DISTANCE_MARGIN
+            })
+            score_spread = max(distances) - best
+        else:
+            practice_areas = 0
+            score_spread = 0.0
+        
+        features = {
+            "query_words": query_words,
+            "practice_areas": practice_areas,
+            "score_spread": score_spread
+        }
+        
+        for route in self.model_routes:
+            if "max_query_words" in route and query_words > route["max_query_words"]:
+                continue
+            if "max_practice_areas" in route and practice_areas > route["max_practice_areas"]:
+                continue
+            if "min_score_spread" in route and score_spread < route["min_score_spread"]:
+                continue
+            return route, features
+        return self.model_routes[-1], features
+    
+    def _record_route_stats(self, route_name: str, latency_ms: float, features: Dict[str, Any],
+                            usage=None, error: bool = False):
+        """Accumulate latency, token usage and classification inputs for a model route"""
+        stats = self.route_stats.setdefault(route_name, _empty_route_stats())
+        stats["requests"] += 1
+        stats["total_latency_ms"] += latency_ms
+        stats["total_query_words"] += features["query_words"]
+        stats["total_practice_areas"] += features["practice_areas"]
+        stats["total_score_spread"] += features["score_spread"]
+        if error:
+            stats["errors"] += 1
+        if usage is not None:
+            stats["prompt_tokens"] += usage.prompt_tokens or 0
+            stats["completion_tokens"] += usage.completion_tokens or 0
+    
+    def get_route_stats(self) -> Dict[str, Any]:
+        """Return per-route request counts, average latency, token usage and classification inputs"""
+        summary = {}
+        for name, stats in self.route_stats.items():
+            requests = stats["requests"]
+            summary[name] = {
+                **stats,
+                "avg_latency_ms": stats["total_latency_ms"] / requests if requests else 0.0,
+                "avg_completion_tokens": stats["completion_tokens"] / requests if requests else 0.0,
+                "avg_query_words": stats["total_query_words"] / requests if requests else 0.0,
+                "avg_practice_areas": stats["total_practice_areas"] / requests if requests else 0.0,
+                "avg_score_spread": stats["total_score_spread"] / requests if requests else 0.0
+            }
+        return summary
+    
     async def query(self, query: str, max_results: int = 5) -> Dict[str, Any]:
         """Query the RAG system with a user question"""
+        start_time = time.perf_counter()
         
         # Generate embedding for the query using OpenAI
         query_embedding = self._get_embedding(query)
@@ -402,7 +593,7 @@ class RAGService:
         # Search for similar documents
         results = self.collection.query(
             query_embeddings=[query_embedding],
-            n_results=max_results
+            n_results=max(max_results, CLASSIFICATION_CANDIDATES)
         )
         
         # Extract relevant documents
@@ -410,6 +601,17 @@ class RAGService:
         metadatas = results['metadatas'][0] if results['metadatas'] else []
         distances = results['distances'][0] if results['distances'] else []
         
+        # Route by query complexity; max_results from the caller is an upper bound
+        route, features = self._classify_query(
+            query,
+            metadatas[:CLASSIFICATION_CANDIDATES],
+            distances[:CLASSIFICATION_CANDIDATES]
+        )
+        route_results = min(route.get("max_results", max_results), max_results)
+        documents = documents[:route_results]
+        metadatas = metadatas[:route_results]
+        distances = distances[:route_results]
+        
         # Prepare context for LLM
         context = "\n\n".join(documents)
         
@@ -430,16 +632,22 @@ class RAGService:
         
         try:
             response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=route.get("model", "gpt-3.5-turbo"),
                 messages=[
                     {"role": "system", "content": "You are a knowledgeable legal assistant specializing in helping paralegals with legal research and document analysis."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=500,
+                max_tokens=route.get("max_tokens", 500),
                 temperature=0.3
             )
             
             answer = response.choices[0].message.content
+            self._record_route_stats(
+                route["name"],
+                (time.perf_counter() - start_time) * 1000,
+                features,
+                usage=getattr(response, "usage", None)
+            )
             
             # Calculate confidence based on similarity scores
             confidence = 1.0 - (sum(distances) / len(distances)) if distances else 0.5
@@ -456,12 +664,15 @@ class RAGService:
             return {
                 "answer": answer,
                 "sources": sources,
-                "confidence": min(confidence, 1.0)
+                "confidence": min(confidence, 1.0),
+                "route": route["name"]
             }
             
         except Exception as e:
+            self._record_route_stats(route["name"], (time.perf_counter() - start_time) * 1000, features, error=True)
             return {
                 "answer": f"I apologize, but I encountered an error while processing your request: {str(e)}",
                 "sources": [],
-                "confidence": 0.0
+                "confidence": 0.0,
+                "route": route["name"]
             }
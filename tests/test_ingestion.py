@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import rag_service
+from backend.ingestion import IngestionQueue, IngestionQueueFull
+
+
+class FakeRAGService:
+    """Stands in for RAGService's document store; writes fail for ids in fail_ids"""
+
+    def __init__(self, documents=None):
+        self.documents = dict(documents or {})
+        self.fail_ids = set()
+        self.upsert_calls = []
+        self.delete_calls = []
+
+    def get_document_metadata(self, ids):
+        return {doc_id: self.documents[doc_id]["metadata"] for doc_id in ids if doc_id in self.documents}
+
+    def upsert_documents(self, documents):
+        self.upsert_calls.append([doc["id"] for doc in documents])
+        failing = [doc["id"] for doc in documents if doc["id"] in self.fail_ids]
+        if failing:
+            raise RuntimeError(f"upsert failed for {failing}")
+        for doc in documents:
+            self.documents[doc["id"]] = {"content": doc["content"], "metadata": doc["metadata"]}
+
+    def delete_documents(self, ids):
+        self.delete_calls.append(list(ids))
+        failing = [doc_id for doc_id in ids if doc_id in self.fail_ids]
+        if failing:
+            raise RuntimeError(f"delete failed for {failing}")
+        for doc_id in ids:
+            del self.documents[doc_id]
+
+
+def doc(doc_id, content="text", metadata=None):
+    return {"id": doc_id, "content": content, "metadata": metadata}
+
+
+def run_batch(service, submissions):
+    """Submit jobs before the worker starts so they land in one batch, then wait for them"""
+    async def run():
+        queue = IngestionQueue(service, batch_window=0.05)
+        jobs = [queue.submit(action, **kwargs) for action, kwargs in submissions]
+        queue.start()
+        while any(job["status"] in ("queued", "running") for job in jobs):
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return jobs
+
+    return asyncio.run(run())
+
+
+def test_add_then_update_keeps_metadata():
+    service = FakeRAGService()
+    add, update = run_batch(service, [
+        ("add", {"documents": [doc("e", "first", {"type": "tort_law"})]}),
+        ("update", {"documents": [doc("e", "second")]}),
+    ])
+    assert add["status"] == "completed"
+    assert update["status"] == "completed"
+    assert service.documents["e"] == {"content": "second", "metadata": {"type": "tort_law"}}
+    # Both jobs collapse into a single write
+    assert service.upsert_calls == [["e"]]
+
+
+def test_delete_then_add_replaces_document():
+    service = FakeRAGService({"x": {"content": "old", "metadata": {"type": "tax_law"}}})
+    delete, add = run_batch(service, [
+        ("delete", {"ids": ["x"]}),
+        ("add", {"documents": [doc("x", "new", {"type": "tort_law"})]}),
+    ])
+    assert delete["status"] == "completed"
+    assert add["status"] == "completed"
+    assert service.documents["x"] == {"content": "new", "metadata": {"type": "tort_law"}}
+    assert service.delete_calls == []
+
+
+def test_write_failure_fails_every_job_for_that_id():
+    service = FakeRAGService()
+    service.fail_ids = {"e"}
+    add_e, update_e, add_f = run_batch(service, [
+        ("add", {"documents": [doc("e", "first", {"type": "tort_law"})]}),
+        ("update", {"documents": [doc("e", "second")]}),
+        ("add", {"documents": [doc("f", "other", {"type": "tax_law"})]}),
+    ])
+    assert add_e["status"] == "failed"
+    assert update_e["status"] == "failed"
+    assert add_f["status"] == "completed"
+    assert "e" not in service.documents
+    assert "f" in service.documents
+    # One batched upsert, then one retry per document
+    assert service.upsert_calls == [["e", "f"], ["e"], ["f"]]
+
+
+def test_failed_add_after_delete_fails_the_delete():
+    service = FakeRAGService({"x": {"content": "old", "metadata": {"type": "tax_law"}}})
+    service.fail_ids = {"x"}
+    delete, add = run_batch(service, [
+        ("delete", {"ids": ["x"]}),
+        ("add", {"documents": [doc("x", "new", {"type": "tort_law"})]}),
+    ])
+    assert delete["status"] == "failed"
+    assert add["status"] == "failed"
+    assert service.documents["x"]["content"] == "old"
+
+
+def test_delete_failure_does_not_fail_upserts():
+    service = FakeRAGService({"x": {"content": "old", "metadata": {"type": "tax_law"}}})
+    service.fail_ids = {"x"}
+    delete, add = run_batch(service, [
+        ("delete", {"ids": ["x"]}),
+        ("add", {"documents": [doc("y", "new", {"type": "tort_law"})]}),
+    ])
+    assert delete["status"] == "failed"
+    assert add["status"] == "completed"
+    assert "x" in service.documents
+    assert "y" in service.documents
+
+
+def test_add_existing_id_fails():
+    service = FakeRAGService({"x": {"content": "old", "metadata": {"type": "tax_law"}}})
+    add, = run_batch(service, [("add", {"documents": [doc("x", "new", {"type": "tort_law"})]})])
+    assert add["status"] == "failed"
+    assert add["error"] == "Documents already exist: x"
+    assert service.documents["x"]["content"] == "old"
+
+
+def test_missing_id_on_update_and_delete_fails():
+    service = FakeRAGService()
+    update, delete = run_batch(service, [
+        ("update", {"documents": [doc("missing", "new")]}),
+        ("delete", {"ids": ["missing"]}),
+    ])
+    assert update["status"] == "failed"
+    assert update["error"] == "Documents not found: missing"
+    assert delete["status"] == "failed"
+    assert delete["error"] == "Documents not found: missing"
+    assert service.upsert_calls == []
+    assert service.delete_calls == []
+
+
+def test_submit_raises_when_queue_full():
+    async def run():
+        queue = IngestionQueue(FakeRAGService(), max_queued_jobs=1)
+        queue.submit("delete", ids=["a"])
+        with pytest.raises(IngestionQueueFull):
+            queue.submit("delete", ids=["b"])
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Importing the app builds a RAGService; skip the OpenAI and ChromaDB setup
+    monkeypatch.setattr(rag_service.RAGService, "__init__", lambda self: None)
+    from backend import main
+
+    # The worker is not started, so queued jobs stay queued
+    monkeypatch.setattr(main, "ingestion_queue", IngestionQueue(FakeRAGService(), max_queued_jobs=1))
+    return TestClient(main.app)
+
+
+def test_documents_endpoint_returns_503_when_queue_full(client):
+    response = client.post("/documents", json={"documents": [{"id": "a", "content": "text"}]})
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+
+    response = client.delete("/documents/a")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+@pytest.mark.parametrize("body", [
+    {"documents": []},
+    {"documents": [{"id": "a", "content": ""}]},
+    {"documents": [{"id": "a", "content": "text", "metadata": {}}]},
+    {"documents": [{"id": "a", "content": "text", "metadata": {"type": {"nested": 1}}}]},
+    {"documents": [{"id": "a", "content": "text"}, {"id": "a", "content": "again"}]},
+])
+def test_invalid_documents_rejected_before_queueing(client, body):
+    response = client.post("/documents", json=body)
+    assert response.status_code == 422
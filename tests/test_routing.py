@@ -0,0 +1,206 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from backend.rag_service import (
+    CLASSIFICATION_CANDIDATES,
+    DEFAULT_MODEL_ROUTES,
+    RAGService,
+    _empty_route_stats,
+    load_model_routes,
+)
+
+
+class FakeCollection:
+    def __init__(self, distances, types):
+        self.distances = distances
+        self.types = types
+        self.requested = None
+
+    def query(self, query_embeddings, n_results):
+        self.requested = n_results
+        distances = self.distances[:n_results]
+        return {
+            "documents": [[f"doc {i}" for i in range(len(distances))]],
+            "metadatas": [[{"type": doc_type} for doc_type in self.types[:n_results]]],
+            "distances": [distances],
+        }
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.chat_calls = []
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    def _embed(self, model, input):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[0.0], index=0)])
+
+    def _chat(self, **kwargs):
+        self.chat_calls.append(kwargs)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        )
+
+
+def make_service(routes=DEFAULT_MODEL_ROUTES, collection=None):
+    service = RAGService.__new__(RAGService)
+    service.model_routes = routes
+    service.route_stats = {route["name"]: _empty_route_stats() for route in routes}
+    service.openai_client = FakeOpenAI()
+    service.collection = collection
+    return service
+
+
+def words(count):
+    return " ".join(["word"] * count)
+
+
+def route_name(service, query, types, distances):
+    route, _ = service._classify_query(query, [{"type": t} for t in types], distances)
+    return route["name"]
+
+
+def test_simple_route_at_threshold_boundaries():
+    service = make_service()
+    assert route_name(service, words(15), ["contract_law", "tort_law"], [0.0, 0.5]) == "simple"
+
+
+def test_too_many_words_leaves_simple_route():
+    service = make_service()
+    assert route_name(service, words(16), ["contract_law", "tort_law"], [0.0, 0.5]) == "standard"
+    assert route_name(service, words(40), ["contract_law", "tort_law"], [0.0, 0.5]) == "standard"
+    assert route_name(service, words(41), ["contract_law", "tort_law"], [0.0, 0.5]) == "complex"
+
+
+def test_practice_areas_within_margin_are_counted():
+    service = make_service()
+    # Second area is within PRACTICE_AREA_DISTANCE_MARGIN of the best match
+    assert route_name(service, words(3), ["contract_law", "tort_law", "tax_law"], [0.0, 0.1, 0.5]) == "standard"
+    assert route_name(service, words(3), ["contract_law", "tort_law", "tax_law"], [0.0, 0.05, 0.1]) == "complex"
+
+
+def test_small_score_spread_leaves_simple_route():
+    service = make_service()
+    assert route_name(service, words(3), ["contract_law", "contract_law"], [0.0, 0.05]) == "simple"
+    assert route_name(service, words(3), ["contract_law", "contract_law"], [0.0, 0.04]) == "standard"
+
+
+def test_no_results_has_no_spread():
+    service = make_service()
+    route, features = service._classify_query(words(3), [], [])
+    assert route["name"] == "standard"
+    assert features == {"query_words": 3, "practice_areas": 0, "score_spread": 0.0}
+
+
+def test_falls_back_to_last_route():
+    routes = [{"name": "short", "max_query_words": 2}, {"name": "tiny", "max_query_words": 1}]
+    service = make_service(routes)
+    assert route_name(service, words(5), ["contract_law"], [0.0]) == "tiny"
+
+
+def test_route_stats_with_no_requests():
+    stats = make_service().get_route_stats()
+    assert set(stats) == {"simple", "standard", "complex"}
+    for route_stats in stats.values():
+        assert route_stats["requests"] == 0
+        assert route_stats["avg_latency_ms"] == 0.0
+        assert route_stats["avg_completion_tokens"] == 0.0
+        assert route_stats["avg_query_words"] == 0.0
+        assert route_stats["avg_practice_areas"] == 0.0
+        assert route_stats["avg_score_spread"] == 0.0
+
+
+def test_route_stats_averages():
+    service = make_service()
+    usage = SimpleNamespace(prompt_tokens=100, completion_tokens=40)
+    service._record_route_stats("simple", 10.0, {"query_words": 4, "practice_areas": 1, "score_spread": 0.2}, usage=usage)
+    service._record_route_stats("simple", 30.0, {"query_words": 8, "practice_areas": 1, "score_spread": 0.4}, error=True)
+    stats = service.get_route_stats()["simple"]
+    assert stats["requests"] == 2
+    assert stats["errors"] == 1
+    assert stats["avg_latency_ms"] == 20.0
+    assert stats["avg_completion_tokens"] == 20.0
+    assert stats["avg_query_words"] == 6.0
+    assert stats["avg_practice_areas"] == 1.0
+    assert stats["avg_score_spread"] == pytest.approx(0.3)
+
+
+def query(service, text, max_results):
+    return asyncio.run(service.query(text, max_results))
+
+
+def test_route_caps_max_results():
+    collection = FakeCollection([0.0, 0.3, 0.4, 0.5, 0.6], ["contract_law"] * 5)
+    service = make_service(collection=collection)
+
+    result = query(service, words(3), 5)
+    assert result["route"] == "simple"
+    assert len(result["sources"]) == 2
+    assert service.openai_client.chat_calls[-1]["max_tokens"] == 200
+    assert collection.requested == CLASSIFICATION_CANDIDATES
+
+
+def test_caller_max_results_is_upper_bound():
+    collection = FakeCollection([0.0, 0.3, 0.4, 0.5, 0.6], ["contract_law"] * 5)
+    service = make_service(collection=collection)
+
+    result = query(service, words(3), 1)
+    assert result["route"] == "simple"
+    assert len(result["sources"]) == 1
+    # Classification still sees CLASSIFICATION_CANDIDATES documents
+    assert collection.requested == CLASSIFICATION_CANDIDATES
+
+
+def test_classification_ignores_extra_results():
+    # Spread over the first five documents is below the simple threshold;
+    # the far-away documents fetched for a large max_results must not change that
+    distances = [0.0, 0.01, 0.02, 0.03, 0.04] + [0.9] * 15
+    collection = FakeCollection(distances, ["contract_law"] * 20)
+    service = make_service(collection=collection)
+
+    assert query(service, words(3), 5)["route"] == "standard"
+    assert query(service, words(3), 20)["route"] == "standard"
+    assert collection.requested == 20
+
+
+def test_route_stats_recorded_per_query():
+    collection = FakeCollection([0.0, 0.3, 0.4, 0.5, 0.6], ["contract_law"] * 5)
+    service = make_service(collection=collection)
+    query(service, words(3), 5)
+    stats = service.get_route_stats()["simple"]
+    assert stats["requests"] == 1
+    assert stats["prompt_tokens"] == 10
+    assert stats["completion_tokens"] == 5
+    assert stats["avg_query_words"] == 3.0
+
+
+@pytest.mark.parametrize("routes", [
+    {"name": "simple"},
+    [],
+    [{"model": "gpt-3.5-turbo"}],
+    [{"name": "simple", "max_query_words": "15"}],
+    [{"name": "simple", "min_score_spread": True}],
+    [{"name": "simple", "max_results": 2.5}],
+    [{"name": "simple", "max_tokens": 0}],
+    [{"name": "simple", "model": 3}],
+])
+def test_invalid_routes_file_uses_defaults(tmp_path, monkeypatch, routes):
+    routes_file = tmp_path / "routes.json"
+    routes_file.write_text(json.dumps(routes))
+    monkeypatch.setenv("MODEL_ROUTES_FILE", str(routes_file))
+    assert load_model_routes() is DEFAULT_MODEL_ROUTES
+
+
+def test_valid_routes_file_is_loaded(tmp_path, monkeypatch):
+    routes = [
+        {"name": "short", "max_query_words": 10, "min_score_spread": 0.1, "max_tokens": 150, "max_results": 2},
+        {"name": "rest", "model": "gpt-3.5-turbo"},
+    ]
+    routes_file = tmp_path / "routes.json"
+    routes_file.write_text(json.dumps(routes))
+    monkeypatch.setenv("MODEL_ROUTES_FILE", str(routes_file))
+    assert load_model_routes() == routes